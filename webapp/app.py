@@ -1,15 +1,50 @@
-from flask import Flask, request, render_template, redirect, url_for, session, jsonify, make_response
+from flask import Flask, Response, request, render_template, redirect, url_for, session, jsonify, make_response
 from authlib.integrations.flask_client import OAuth
+from flask.json.provider import DefaultJSONProvider
+from flask_session.sessions import RedisSessionInterface
 import os
 import requests
 import json
 import time
+import hashlib
+import base64
+import heapq
+import itertools
+import tempfile
+import threading
+from datetime import timedelta
 from functools import wraps
 from urllib.parse import urlencode
 import jwt
+import orjson
+import redis
 import logging
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes jsonify() and dict responses with orjson
+
+    Dates are passed through to Flask's default() so they keep the HTTP date
+    format. Unlike Flask's provider, non-ASCII text is emitted as UTF-8
+    rather than \\u-escaped, since orjson has no ensure_ascii option.
+    """
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this')
 
 # Configure logging
@@ -22,80 +57,378 @@ KEYCLOAK_REALM = os.environ.get('KEYCLOAK_REALM', 'master')
 KEYCLOAK_CLIENT_ID = os.environ.get('KEYCLOAK_CLIENT_ID', 'webapp')
 KEYCLOAK_CLIENT_SECRET = os.environ.get('KEYCLOAK_CLIENT_SECRET', 'webapp-secret')
 
+# Keycloak endpoints, built once from the configuration above
+KEYCLOAK_REALM_URL = f"{KEYCLOAK_URL}/realms/{KEYCLOAK_REALM}"
+TOKEN_URL = f"{KEYCLOAK_REALM_URL}/protocol/openid-connect/token"
+JWKS_URL = f"{KEYCLOAK_REALM_URL}/protocol/openid-connect/certs"
+OIDC_METADATA_URL = f"{KEYCLOAK_REALM_URL}/.well-known/openid-configuration"
+
 # Wiki.js configuration
 WIKIJS_URL = os.environ.get('WIKIJS_URL', f"https://{os.environ.get('DOMAIN', 'rancher.local')}/wiki")
 WIKIJS_ENABLED = os.environ.get('WIKIJS_ENABLED', 'true').lower() == 'true'
 DOCUMENTATION_URL = os.environ.get('DOCUMENTATION_URL', WIKIJS_URL)
 
+# Session cookie security (secure cookies unless FLASK_DEBUG or overridden);
+# app.run(debug=...) sets app.debug too late to be read here
+_debug_env = os.environ.get('FLASK_DEBUG', 'false').lower() == 'true'
+app.config.update(
+    PERMANENT_SESSION_LIFETIME=timedelta(hours=1),
+    SESSION_COOKIE_SECURE=os.environ.get('SESSION_COOKIE_SECURE', str(not _debug_env)).lower() == 'true',
+    SESSION_COOKIE_HTTPONLY=os.environ.get('SESSION_COOKIE_HTTPONLY', 'true').lower() == 'true',
+    SESSION_COOKIE_SAMESITE=os.environ.get('SESSION_COOKIE_SAMESITE', 'Lax')
+)
+
+# Server-side sessions in Redis; the cookie only carries the signed session ID
+class RedisSessionStore(RedisSessionInterface):
+    """Flask-Session Redis store that only writes sessions that changed
+
+    Flask-Session 0.5 runs SETEX and Set-Cookie for every non-empty session
+    on every response, including each nginx auth_request subrequest.
+    """
+
+    def save_session(self, app, session, response):
+        if session and not session.modified:
+            return
+        super().save_session(app, session, response)
+
+        # Pre-login sessions (OAuth state, redirect target) only need to live
+        # through the login flow, so an anonymous flood cannot pin memory
+        if session and not session.permanent:
+            self.redis.expire(self.key_prefix + session.sid, PRELOGIN_SESSION_TTL)
+
+    def regenerate(self, session):
+        """Move session data to a fresh ID and drop the old key (run at login)"""
+        self.redis.delete(self.key_prefix + session.sid)
+        session.sid = self._generate_sid()
+        session.modified = True
+
+
+PRELOGIN_SESSION_TTL = 600  # seconds
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
+redis_client = redis.from_url(REDIS_URL)
+
+# Sessions start non-permanent and therefore empty, so anonymous requests
+# (health polls, probes) never create a Redis key; login marks them permanent
+app.session_interface = RedisSessionStore(
+    redis_client,
+    key_prefix='webapp:session:',
+    use_signer=True,
+    permanent=False
+)
+
+# Shared HTTP session for Keycloak calls so connections are kept alive and reused
+KEYCLOAK_TIMEOUT = (2, 10)  # (connect, read) seconds
+
+_kc_session = requests.Session()
+_kc_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+)
+_kc_session.mount('http://', _kc_adapter)
+_kc_session.mount('https://', _kc_adapter)
+
+# OIDC discovery configuration
+OIDC_METADATA_CACHE = os.environ.get('OIDC_METADATA_CACHE', '/tmp/oidc-metadata.json')
+
+# JWKS documents keyed by jwks_uri; the single source of Keycloak signing keys
+_jwks_cache = {}
+
+
+def _fetch_json(url):
+    """GET a JSON document from Keycloak (retries come from the session adapter)"""
+    response = _kc_session.get(url, timeout=KEYCLOAK_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_jwks(jwks_uri, force=False):
+    """Return the JWKS for jwks_uri, fetching it on first use or when forced"""
+    jwks = _jwks_cache.get(jwks_uri)
+    if jwks is None or force:
+        jwks = _fetch_json(jwks_uri)
+        _jwks_cache[jwks_uri] = jwks
+    return jwks
+
+
+def load_oidc_metadata():
+    """Fetch the Keycloak discovery document, falling back to the on-disk copy"""
+    try:
+        metadata = _fetch_json(OIDC_METADATA_URL)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f"Could not fetch OIDC metadata from {OIDC_METADATA_URL}: {e}")
+        try:
+            with open(OIDC_METADATA_CACHE) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        logger.info(f"Using cached OIDC metadata from {OIDC_METADATA_CACHE}")
+    else:
+        # Write to a temp file and rename it into place so workers starting
+        # together never read or leave behind a half-written copy
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(OIDC_METADATA_CACHE) or '.',
+                                             suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                json.dump(metadata, f)
+            os.replace(tmp_path, OIDC_METADATA_CACHE)
+        except OSError as e:
+            logger.warning(f"Could not persist OIDC metadata: {e}")
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    # Seed the signing keys so ID token validation skips the JWKS fetch;
+    # authlib refetches them itself if it meets an unknown key ID
+    jwks_uri = metadata.get('jwks_uri')
+    if jwks_uri:
+        try:
+            metadata['jwks'] = get_jwks(jwks_uri)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Could not fetch JWKS from {jwks_uri}: {e}")
+
+    return metadata
+
+
 # OAuth setup
 oauth = OAuth(app)
+oidc_metadata = load_oidc_metadata()
+if oidc_metadata:
+    oidc_kwargs = {'server_metadata': oidc_metadata}
+else:
+    # Keycloak unreachable and nothing cached; let authlib discover on first use
+    oidc_kwargs = {'server_metadata_url': OIDC_METADATA_URL}
+
 keycloak = oauth.register(
     name='keycloak',
     client_id=KEYCLOAK_CLIENT_ID,
     client_secret=KEYCLOAK_CLIENT_SECRET,
-    server_metadata_url=f'{KEYCLOAK_URL}/realms/{KEYCLOAK_REALM}/.well-known/openid-configuration',
     client_kwargs={
         'scope': 'openid email profile roles'
-    }
+    },
+    **oidc_kwargs
 )
 
 
+class ExpiringCache:
+    """Bounded dict cache whose expired entries are evicted in bulk by sweep()
+
+    Lookups are a single dict access with no clock check, so an entry can
+    outlive its deadline by up to one sweep interval.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = {}
+        self._entry_ids = {}
+        # (deadline, entry id, key); the unique id breaks deadline ties so keys
+        # are never compared, and entries whose id is stale are skipped
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                self._evict_next()
+            entry_id = next(self._counter)
+            heapq.heappush(self._heap, (expires_at, entry_id, key))
+            self._entry_ids[key] = entry_id
+            self._data[key] = value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._entry_ids.pop(key, None)
+            return self._data.pop(key, default)
+
+    def sweep(self, now=None):
+        """Evict every entry whose deadline has passed"""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                self._discard(*heapq.heappop(self._heap))
+
+    def _evict_next(self):
+        # Drop the live entry closest to expiry to make room
+        while self._heap:
+            if self._discard(*heapq.heappop(self._heap)):
+                return
+
+    def _discard(self, deadline, entry_id, key):
+        if self._entry_ids.get(key) != entry_id:
+            return False
+        del self._entry_ids[key]
+        del self._data[key]
+        return True
+
+
+# Expired cache entries are removed by a background timer, not on lookup
+CACHE_SWEEP_INTERVAL = 5  # seconds
+
+# Decoded JWT claims keyed by a truncated hash of the raw token. Entries live
+# for at most 60 seconds and are swept once the token's own expiry passes.
+_jwt_cache = ExpiringCache(maxsize=10000)
+
+# Clock skew tolerated between this host and Keycloak when checking exp/iat
+JWT_LEEWAY = 30  # seconds
+
+# Parsed realm signing keys by key ID, built from the JWKS in _jwks_cache
+_signing_keys = {}
+
+
+def _signing_key(token):
+    """Return the realm key that signed token, refetching the JWKS once for an unknown kid"""
+    global _signing_keys
+    kid = jwt.get_unverified_header(token).get('kid')
+    key = _signing_keys.get(kid)
+    if key is not None:
+        return key
+
+    for force in (False, True):
+        jwk_set = jwt.PyJWKSet.from_dict(get_jwks(JWKS_URL, force=force))
+        _signing_keys = {jwk.key_id: jwk.key for jwk in jwk_set.keys}
+        key = _signing_keys.get(kid)
+        if key is not None:
+            return key
+    raise jwt.PyJWKSetError(f"No signing key in the realm JWKS matches kid {kid!r}")
+
+
+def _claims(token):
+    """Parse a JWT payload without verifying it (base64url segment + JSON)"""
+    segment = token.split('.', 2)[1]
+    segment += '=' * (-len(segment) % 4)
+    return orjson.loads(base64.urlsafe_b64decode(segment))
+
+
+def _decode_cached(token):
+    """Verify a Keycloak-signed JWT and decode it, reusing cached claims"""
+    key = hashlib.sha256(token.encode()).digest()[:16]
+    claims = _jwt_cache.get(key)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(token, _signing_key(token), algorithms=['RS256'], leeway=JWT_LEEWAY,
+                        options={'verify_aud': False})
+    expires_at = time.time() + 60
+    exp = claims.get('exp')
+    if exp is not None:
+        expires_at = min(expires_at, exp)
+    _jwt_cache.set(key, claims, expires_at)
+    return claims
+
+
+def _extract_groups(decoded, client_id=KEYCLOAK_CLIENT_ID):
+    """Collect groups plus realm and client roles from decoded token claims"""
+    groups = set(decoded.get('groups', ()))
+    groups.update(decoded.get('realm_access', {}).get('roles', ()))
+    groups.update(decoded.get('resource_access', {}).get(client_id, {}).get('roles', ()))
+    return groups
+
+
+# /auth/verify outcomes keyed by (session cookie hash, role); see auth_verify()
+_VERIFY_ROLES = (None, 'admin', 'view', 'modify')
+_verify_cache = ExpiringCache(maxsize=50000)
+
+
+def _verify_cache_id():
+    """Return a short hash of the current session cookie, or None without one"""
+    cookie = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return None
+    return hashlib.sha256(cookie.encode()).digest()[:16]
+
+
+def forget_verify_cache():
+    """Drop cached /auth/verify results for the current session cookie"""
+    cache_id = _verify_cache_id()
+    if cache_id is None:
+        return
+    for role in _VERIFY_ROLES:
+        _verify_cache.pop((cache_id, role), None)
+
+
+def _sweep_caches():
+    """Evict expired cache entries, then schedule the next sweep"""
+    try:
+        now = time.time()
+        _jwt_cache.sweep(now)
+        _verify_cache.sweep(now)
+    except Exception as e:
+        logger.error(f"Cache sweep failed: {e}")
+    finally:
+        # Always reschedule, or the caches would stop expiring entries
+        timer = threading.Timer(CACHE_SWEEP_INTERVAL, _sweep_caches)
+        timer.daemon = True
+        timer.start()
+
+
+_sweep_caches()
+
+
 # Rate limiting class for security
 class RateLimiter:
-    def __init__(self):
-        self.attempts = {}
-        self.lockouts = {}
+    """Failed-login limiter shared by all workers through Redis
 
-    def is_rate_limited(self, username, max_attempts=5, window=300, lockout_duration=900):
-        """Check if username is rate limited (5 attempts per 5 minutes, 15 min lockout)"""
-        now = time.time()
-        username = username.lower()  # Case insensitive
+    Failures are counted with INCR on a key that expires one window after
+    the first failure; reaching max_attempts sets a lockout key that expires
+    on its own, so Redis bounds memory for arbitrary usernames.
+    """
 
-        # Check if user is in lockout period
-        if username in self.lockouts:
-            if now - self.lockouts[username] < lockout_duration:
-                return True
-            else:
-                # Lockout period expired, remove from lockouts
-                del self.lockouts[username]
+    def __init__(self, client, max_attempts=5, window=300, lockout_duration=900,
+                 key_prefix='webapp:ratelimit:'):
+        self.client = client
+        self.max_attempts = max_attempts
+        self.window = window
+        self.lockout_duration = lockout_duration
+        self.key_prefix = key_prefix
+
+    def _keys(self, username):
+        """Return the (attempts, lockout) keys for a case-insensitive username"""
+        user_id = hashlib.sha256(username.lower().encode()).hexdigest()[:32]
+        return f"{self.key_prefix}attempts:{user_id}", f"{self.key_prefix}lockout:{user_id}"
 
-        # Initialize attempts list if not exists
-        if username not in self.attempts:
-            self.attempts[username] = []
+    def is_rate_limited(self, username):
+        """Check if username is rate limited (5 attempts per 5 minutes, 15 min lockout)"""
+        attempts_key, lockout_key = self._keys(username)
 
-        # Remove old attempts outside the window
-        self.attempts[username] = [t for t in self.attempts[username] if now - t < window]
+        pipe = self.client.pipeline()
+        pipe.exists(lockout_key)
+        pipe.get(attempts_key)
+        locked_out, attempts = pipe.execute()
+
+        # Check if user is in lockout period
+        if locked_out:
+            return True
 
         # Check if too many attempts
-        if len(self.attempts[username]) >= max_attempts:
-            # Add to lockouts
-            self.lockouts[username] = now
-            logger.warning(f"User {username} locked out due to too many failed attempts")
+        if attempts is not None and int(attempts) >= self.max_attempts:
+            self.client.set(lockout_key, 1, ex=self.lockout_duration)
+            logger.warning(f"User {username.lower()} locked out due to too many failed attempts")
             return True
 
         return False
 
     def record_attempt(self, username):
         """Record a failed login attempt"""
-        now = time.time()
-        username = username.lower()
-
-        if username not in self.attempts:
-            self.attempts[username] = []
+        attempts_key, _ = self._keys(username)
 
-        self.attempts[username].append(now)
+        # Start the window on the first failure; plain EXPIRE keeps Redis 6 support
+        if self.client.incr(attempts_key) == 1:
+            self.client.expire(attempts_key, self.window)
 
     def clear_attempts(self, username):
         """Clear attempts on successful login"""
-        username = username.lower()
-        if username in self.attempts:
-            del self.attempts[username]
-        if username in self.lockouts:
-            del self.lockouts[username]
+        self.client.delete(*self._keys(username))
 
 
 # Initialize rate limiter
-rate_limiter = RateLimiter()
+rate_limiter = RateLimiter(redis_client)
 
 
 def require_auth(f):
@@ -114,14 +447,18 @@ def require_admin(f):
         if 'user' not in session:
             return redirect(url_for('index'))
 
-        user_groups = session.get('user', {}).get('groups', [])
-        if 'admin' not in user_groups:
+        if 'admin' not in session.get('groups', ()):
             return "Access Denied: Admin role required", 403
         return f(*args, **kwargs)
 
     return decorated_function
 
 
+# Endpoints gated in before_request() instead of with the decorators above
+_AUTH_ENDPOINTS = frozenset({'monitoring', 'profile', 'documentation'})
+_ADMIN_ENDPOINTS = frozenset({'admin'})
+
+
 # Add template context processor to make Wiki.js variables available in all templates
 @app.context_processor
 def inject_wikijs_config():
@@ -143,14 +480,12 @@ def index():
 
 
 @app.route('/monitoring')
-@require_auth
 def monitoring():
     """Main monitoring dashboard page"""
     return render_template('monitoring.html', user=session['user'])
 
 
 @app.route('/documentation')
-@require_auth
 def documentation():
     """Redirect to Wiki.js documentation"""
     if WIKIJS_ENABLED:
@@ -181,16 +516,14 @@ def direct_login():
     if not username or not password:
         return render_template('login.html', error="Username and password are required")
 
-    # Rate limiting check
-    if rate_limiter.is_rate_limited(username):
-        logger.warning(f"Rate limit exceeded for user: {username}")
-        return render_template('login.html',
-                               error="Too many failed attempts. Account temporarily locked. Please try again later.")
-
     try:
-        # Direct authentication with Keycloak using password grant
-        token_url = f"{KEYCLOAK_URL}/realms/{KEYCLOAK_REALM}/protocol/openid-connect/token"
+        # Rate limiting check
+        if rate_limiter.is_rate_limited(username):
+            logger.warning(f"Rate limit exceeded for user: {username}")
+            return render_template('login.html',
+                                   error="Too many failed attempts. Account temporarily locked. Please try again later.")
 
+        # Direct authentication with Keycloak using password grant
         token_data = {
             'grant_type': 'password',
             'client_id': KEYCLOAK_CLIENT_ID,
@@ -203,64 +536,56 @@ def direct_login():
         logger.info(f"Attempting direct login for user: {username}")
 
         # Request tokens from Keycloak
-        response = requests.post(token_url, data=token_data, timeout=10)
+        response = _kc_session.post(TOKEN_URL, data=token_data, timeout=KEYCLOAK_TIMEOUT)
 
         if response.status_code == 200:
             tokens = response.json()
             access_token = tokens.get('access_token')
 
             if access_token:
-                # Get user info from Keycloak
-                userinfo_url = f"{KEYCLOAK_URL}/realms/{KEYCLOAK_REALM}/protocol/openid-connect/userinfo"
-                headers = {'Authorization': f'Bearer {access_token}'}
-
-                userinfo_response = requests.get(userinfo_url, headers=headers, timeout=10)
-
-                if userinfo_response.status_code == 200:
-                    user_info = userinfo_response.json()
-
-                    # Decode JWT to get groups and roles
-                    groups = []
-                    try:
-                        decoded = jwt.decode(access_token, options={"verify_signature": False})
-                        groups = decoded.get('groups', [])
-                        # Also check for realm_access roles
-                        if 'realm_access' in decoded:
-                            realm_roles = decoded['realm_access'].get('roles', [])
-                            groups.extend(realm_roles)
-                        # Check for resource_access roles
-                        if 'resource_access' in decoded and KEYCLOAK_CLIENT_ID in decoded['resource_access']:
-                            client_roles = decoded['resource_access'][KEYCLOAK_CLIENT_ID].get('roles', [])
-                            groups.extend(client_roles)
-                    except Exception as e:
-                        logger.error(f"Error decoding JWT: {e}")
-
-                    # Store user session
-                    session['user'] = {
-                        'id': user_info.get('sub'),
-                        'username': user_info.get('preferred_username'),
-                        'email': user_info.get('email'),
-                        'name': user_info.get('name'),
-                        'groups': list(set(groups))  # Remove duplicates
-                    }
-
-                    # Store tokens for auth verification
-                    session['access_token'] = access_token
-                    session['refresh_token'] = tokens.get('refresh_token')
-                    session['token_expires'] = time.time() + tokens.get('expires_in', 300)
-
-                    # Clear rate limiting on successful login
-                    rate_limiter.clear_attempts(username)
-
-                    logger.info(f"Direct login successful for user: {username}")
-
-                    # Redirect to monitoring dashboard
-                    redirect_url = request.args.get('redirect', '/monitoring')
-                    return redirect(redirect_url)
-                else:
-                    logger.error(f"Failed to get user info: {userinfo_response.status_code}")
+                # The ID token returned by the token endpoint already carries the
+                # profile claims, so no separate userinfo request is needed
+                id_token = tokens.get('id_token')
+                try:
+                    user_info = _claims(id_token) if id_token else _decode_cached(access_token)
+                except Exception as e:
+                    logger.error(f"Failed to read user claims from token: {e}")
                     rate_limiter.record_attempt(username)
                     return render_template('login.html', error="Failed to retrieve user information")
+
+                # Decode JWT to get groups and roles; never log in without them
+                try:
+                    groups = _extract_groups(_decode_cached(access_token))
+                except Exception as e:
+                    logger.error(f"Error verifying access token for user {username}: {e}")
+                    return render_template('login.html', error="Authentication failed. Please try again.")
+
+                # Store user session under a new ID so a pre-login cookie cannot be fixated
+                app.session_interface.regenerate(session)
+                session.permanent = True
+                session['user'] = {
+                    'id': user_info.get('sub'),
+                    'username': user_info.get('preferred_username'),
+                    'email': user_info.get('email'),
+                    'name': user_info.get('name'),
+                    'groups': sorted(groups)
+                }
+                session['groups'] = frozenset(groups)
+                session['_groups_header'] = ','.join(session['user']['groups'])
+
+                # Store tokens for auth verification
+                session['access_token'] = access_token
+                session['refresh_token'] = tokens.get('refresh_token')
+                session['token_expires'] = time.time() + tokens.get('expires_in', 300)
+
+                # Clear rate limiting on successful login
+                rate_limiter.clear_attempts(username)
+
+                logger.info(f"Direct login successful for user: {username}")
+
+                # Redirect to monitoring dashboard
+                redirect_url = request.args.get('redirect', '/monitoring')
+                return redirect(redirect_url)
             else:
                 logger.error("No access token received")
                 rate_limiter.record_attempt(username)
@@ -288,6 +613,9 @@ def direct_login():
     except requests.exceptions.ConnectionError:
         logger.error("Connection error to Keycloak")
         return render_template('login.html', error="Cannot connect to authentication service")
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error during direct login: {e}")
+        return render_template('login.html', error="Authentication service unavailable. Please try again later.")
     except Exception as e:
         logger.error(f"Direct login error: {str(e)}")
         return render_template('login.html', error="Login failed. Please try again.")
@@ -302,29 +630,27 @@ def callback():
 
         # Get user groups from token
         access_token = token.get('access_token')
-        groups = []
+        groups = set()
         if access_token:
             try:
-                decoded = jwt.decode(access_token, options={"verify_signature": False})
-                groups = decoded.get('groups', [])
-                # Also check for realm_access roles
-                if 'realm_access' in decoded:
-                    realm_roles = decoded['realm_access'].get('roles', [])
-                    groups.extend(realm_roles)
-                # Check for resource_access roles
-                if 'resource_access' in decoded and KEYCLOAK_CLIENT_ID in decoded['resource_access']:
-                    client_roles = decoded['resource_access'][KEYCLOAK_CLIENT_ID].get('roles', [])
-                    groups.extend(client_roles)
+                groups = _extract_groups(_decode_cached(access_token))
             except Exception as e:
-                logger.error(f"Error decoding JWT: {e}")
+                # Never log in without the roles the token carries
+                logger.error(f"Error verifying access token: {e}")
+                return render_template('login.html', error="SSO login failed: could not verify access token")
 
+        # New session ID at login so a pre-login cookie cannot be fixated
+        app.session_interface.regenerate(session)
+        session.permanent = True
         session['user'] = {
             'id': user_info.get('sub'),
             'username': user_info.get('preferred_username'),
             'email': user_info.get('email'),
             'name': user_info.get('name'),
-            'groups': list(set(groups))  # Remove duplicates
+            'groups': sorted(groups)
         }
+        session['groups'] = frozenset(groups)
+        session['_groups_header'] = ','.join(session['user']['groups'])
 
         # Store token for auth verification
         session['access_token'] = access_token
@@ -347,6 +673,7 @@ def logout():
     username = session.get('user', {}).get('username', 'unknown')
 
     # Clear session completely
+    forget_verify_cache()
     session.clear()
 
     logger.info(f"User logged out: {username}")
@@ -356,14 +683,12 @@ def logout():
 
 
 @app.route('/admin')
-@require_admin
 def admin():
     """Admin portal page"""
     return render_template('admin.html', user=session['user'])
 
 
 @app.route('/profile')
-@require_auth
 def profile():
     """User profile page"""
     return render_template('profile.html', user=session['user'])
@@ -378,62 +703,120 @@ def auth_verify():
     """
     required_role = request.args.get('role', None)
 
+    # Serve repeat subrequests for the same session from the short-lived cache
+    cache_id = _verify_cache_id()
+    cache_key = None
+    if cache_id is not None:
+        cache_key = (cache_id, required_role if required_role in _VERIFY_ROLES else None)
+        cached = _verify_cache.get(cache_key)
+        # The cache is per worker, so logouts and re-logins handled elsewhere
+        # only show up in the Redis session (already loaded for this request).
+        # Trust a cached outcome only for the same login whose token is live.
+        if cached is not None:
+            status, headers, cached_username, cached_expires = cached
+            user = session.get('user')
+            token_expires = session.get('token_expires', 0)
+            if (user is not None and user.get('username') == cached_username
+                    and token_expires == cached_expires
+                    and not (token_expires > 0 and time.time() > token_expires)):
+                return Response('', status, headers, direct_passthrough=True)
+
     # Check if user is authenticated via session
     if 'user' not in session:
-        logger.debug(f"Auth verification failed: No user in session")
+        logger.debug("Auth verification failed: No user in session")
         return '', 401
 
     user = session['user']
-    user_groups = user.get('groups', [])
+    groups = session.get('groups', ())
 
-    logger.debug(
-        f"Auth verification for user: {user.get('username')}, groups: {user_groups}, required_role: {required_role}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Auth verification for user: %s, groups: %s, required_role: %s",
+                     user.get('username'), user['groups'], required_role)
 
     # Check token expiration
     token_expires = session.get('token_expires', 0)
     if token_expires > 0 and time.time() > token_expires:
-        logger.info(f"Token expired for user: {user.get('username')}")
+        logger.info("Token expired for user: %s", user.get('username'))
+        forget_verify_cache()
         session.clear()
         return '', 401
 
     # Check role requirements
+    status = 200
     if required_role:
-        if required_role == 'admin' and 'admin' not in user_groups:
-            logger.info(f"Auth verification failed: Admin role required but user has: {user_groups}")
-            return '', 403
-        elif required_role in ['view', 'modify'] and not any(
-                group in user_groups for group in [required_role, 'admin']):
-            logger.info(f"Auth verification failed: Role {required_role} required but user has: {user_groups}")
-            return '', 403
+        if required_role == 'admin' and 'admin' not in groups:
+            logger.info("Auth verification failed: Admin role required but user has: %s", user['groups'])
+            status = 403
+        elif (required_role in ('view', 'modify') and required_role not in groups
+              and 'admin' not in groups):
+            logger.info("Auth verification failed: Role %s required but user has: %s", required_role, user['groups'])
+            status = 403
     else:
         # General auth check - must have at least view access or be authenticated
-        if not user_groups and 'user' not in session:
-            logger.info(f"Auth verification failed: No valid groups and not authenticated")
-            return '', 403
+        if not groups and 'user' not in session:
+            logger.info("Auth verification failed: No valid groups and not authenticated")
+            status = 403
 
     # Set headers for nginx
-    resp = make_response('', 200)
-    resp.headers['X-Forwarded-User'] = user.get('username', '')
-    resp.headers['X-Forwarded-Groups'] = ','.join(user_groups)
-    resp.headers['X-User-Email'] = user.get('email', '')
-    resp.headers['X-User-Name'] = user.get('name', '')
+    if status == 200:
+        groups_header = session.get('_groups_header')
+        if groups_header is None:
+            groups_header = ','.join(sorted(groups))
+        headers = {
+            'X-Forwarded-User': user.get('username', ''),
+            'X-Forwarded-Groups': groups_header,
+            'X-User-Email': user.get('email', ''),
+            'X-User-Name': user.get('name', ''),
+        }
+        logger.debug("Auth verification successful for user: %s", user.get('username'))
+    else:
+        headers = {}
+
+    if cache_key is not None:
+        # Cache for 10 seconds, but never past the session's token expiry
+        expires_at = time.time() + 10
+        if token_expires > 0:
+            expires_at = min(expires_at, token_expires)
+        _verify_cache.set(cache_key, (status, headers, user.get('username'), token_expires), expires_at)
 
-    logger.debug(f"Auth verification successful for user: {user.get('username')}")
-    return resp
+    return make_response('', status, headers)
+
+
+# Status payloads only change with configuration, so serialize them once
+_HEALTH_BODY = orjson.dumps({
+    'status': 'healthy',
+    'service': 'webapp',
+    'keycloak_url': KEYCLOAK_URL,
+    'realm': KEYCLOAK_REALM,
+    'wikijs_enabled': WIKIJS_ENABLED,
+    'wikijs_url': WIKIJS_URL if WIKIJS_ENABLED else None,
+    'version': '1.0.0'
+})
+
+_NGINX_STATUS = {
+    'webapp': 'running',
+    'session': 'not authenticated',
+    'keycloak_configured': bool(KEYCLOAK_URL and KEYCLOAK_REALM),
+    'wikijs_enabled': WIKIJS_ENABLED
+}
+_NGINX_STATUS_ANON_BODY = orjson.dumps(_NGINX_STATUS)
+
+_HEALTH_ETAG = hashlib.sha256(_HEALTH_BODY).hexdigest()[:16]
+_NGINX_STATUS_ANON_ETAG = hashlib.sha256(_NGINX_STATUS_ANON_BODY).hexdigest()[:16]
+
+
+def _conditional_json(body, etag, cache_control):
+    """Return body as JSON, or an empty 304 when the client already has this ETag"""
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response(body, status=200, mimetype='application/json', headers=headers)
 
 
 @app.route('/health')
 def health():
     """Health check endpoint"""
-    return {
-        'status': 'healthy',
-        'service': 'webapp',
-        'keycloak_url': KEYCLOAK_URL,
-        'realm': KEYCLOAK_REALM,
-        'wikijs_enabled': WIKIJS_ENABLED,
-        'wikijs_url': WIKIJS_URL if WIKIJS_ENABLED else None,
-        'version': '1.0.0'
-    }, 200
+    return _conditional_json(_HEALTH_BODY, _HEALTH_ETAG, 'max-age=5')
 
 
 @app.route('/nginx-status')
@@ -442,16 +825,16 @@ def nginx_status():
     try:
         # Quick health check
         if 'user' in session:
-            user_status = f"authenticated as {session['user'].get('username')}"
+            body = orjson.dumps({
+                **_NGINX_STATUS,
+                'session': f"authenticated as {session['user'].get('username')}"
+            })
+            etag = hashlib.sha256(body).hexdigest()[:16]
         else:
-            user_status = "not authenticated"
-
-        return {
-            'webapp': 'running',
-            'session': user_status,
-            'keycloak_configured': bool(KEYCLOAK_URL and KEYCLOAK_REALM),
-            'wikijs_enabled': WIKIJS_ENABLED
-        }, 200
+            body = _NGINX_STATUS_ANON_BODY
+            etag = _NGINX_STATUS_ANON_ETAG
+
+        return _conditional_json(body, etag, 'private, max-age=5')
     except Exception as e:
         return {'error': str(e)}, 500
 
@@ -463,8 +846,6 @@ def refresh_token():
         return jsonify({'error': 'No refresh token available'}), 401
 
     try:
-        token_url = f"{KEYCLOAK_URL}/realms/{KEYCLOAK_REALM}/protocol/openid-connect/token"
-
         token_data = {
             'grant_type': 'refresh_token',
             'client_id': KEYCLOAK_CLIENT_ID,
@@ -472,7 +853,7 @@ def refresh_token():
             'refresh_token': session['refresh_token']
         }
 
-        response = requests.post(token_url, data=token_data, timeout=10)
+        response = _kc_session.post(TOKEN_URL, data=token_data, timeout=KEYCLOAK_TIMEOUT)
 
         if response.status_code == 200:
             tokens = response.json()
@@ -483,6 +864,7 @@ def refresh_token():
             return jsonify({'status': 'success'}), 200
         else:
             # Refresh failed, clear session
+            forget_verify_cache()
             session.clear()
             return jsonify({'error': 'Token refresh failed'}), 401
 
@@ -492,10 +874,23 @@ def refresh_token():
 
 
 # Error handlers
+_NOT_FOUND_BODY = b'404\n'
+
+
+def _is_auth_subrequest():
+    """True for nginx auth_request calls (header set in the nginx config)"""
+    return request.headers.get('X-Auth-Request') == '1' or request.path.startswith('/auth/verify')
+
+
+def _wants_html():
+    """True only when the client explicitly lists text/html, as browsers do"""
+    return any(mimetype == 'text/html' for mimetype, _ in request.accept_mimetypes)
+
+
 @app.errorhandler(401)
 def unauthorized(error):
     """Handle unauthorized access"""
-    if request.path.startswith('/auth/verify'):
+    if _is_auth_subrequest():
         # For auth_request calls, just return 401
         return '', 401
     else:
@@ -506,7 +901,7 @@ def unauthorized(error):
 @app.errorhandler(403)
 def forbidden(error):
     """Handle forbidden access"""
-    if request.path.startswith('/auth/verify'):
+    if _is_auth_subrequest():
         # For auth_request calls, just return 403
         return '', 403
     else:
@@ -519,6 +914,11 @@ def forbidden(error):
 @app.errorhandler(404)
 def not_found(error):
     """Handle not found errors"""
+    if _is_auth_subrequest():
+        return '', 404
+    if not _wants_html():
+        # Probes and API clients get a plain body instead of a rendered page
+        return Response(_NOT_FOUND_BODY, status=404, mimetype='text/plain')
     return render_template('error.html',
                            error_code=404,
                            error_message="Page not found"), 404
@@ -533,18 +933,19 @@ def internal_error(error):
                            error_message="Internal server error"), 500
 
 
-# Session configuration for security
+# Access control for protected pages
 @app.before_request
 def before_request():
-    """Configure session security before each request"""
-    session.permanent = True
-    app.permanent_session_lifetime = 3600  # 1 hour session timeout
-
-    # Ensure secure session cookies in production
-    if not app.debug:
-        session.cookie_secure = True
-        session.cookie_httponly = True
-        session.cookie_samesite = 'Lax'
+    """Enforce login on protected pages"""
+    endpoint = request.endpoint
+    if endpoint in _AUTH_ENDPOINTS:
+        if 'user' not in session:
+            return redirect(url_for('index'))
+    elif endpoint in _ADMIN_ENDPOINTS:
+        if 'user' not in session:
+            return redirect(url_for('index'))
+        if 'admin' not in session.get('groups', ()):
+            return "Access Denied: Admin role required", 403
 
 
 # Application startup
@@ -0,0 +1,17 @@
+# Gunicorn configuration for the webapp container
+#
+# gevent workers let one process serve many requests while others wait on
+# Keycloak or Redis. The gevent worker monkey-patches the standard library
+# itself before it imports app.py, so the app needs no patching of its own.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('WEBAPP_PORT', 8000)}"
+
+worker_class = 'gevent'
+workers = int(os.environ.get('GUNICORN_WORKERS', max(2, 2 * multiprocessing.cpu_count())))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Keep client connections from nginx open between requests
+keepalive = 30
+timeout = 120